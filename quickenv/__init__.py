@@ -1,169 +1,261 @@
-#! /usr/bin/env python3
-
+import contextlib
 import os
-import venv
-import subprocess
-import sys
-import shutil
-from distutils.spawn import find_executable
-
-import click
-
-@click.group()
-@click.option(
-    '-p',
-    '--path',
-    type=click.Path(exists=False, dir_okay=True, file_okay=False),
-    default=os.environ.get('QUICKENV_DIRECTORY', os.path.join(os.path.expanduser('~'), '.quickenvs'))
-)
-@click.pass_context
-def cli(ctx, path):
-    """
-    Manages Python virtual environments.
-
-    You can provide the path that venvs will be stored in
-    or set it as the 'QUICKENV_DIRECTORY' environment variable.
-
-    By default, venvs will be stored in '~/.quickenvs'.
-    """
-    if not os.path.exists(path):
-        os.makedirs(path)
-    ctx.obj = {'path': path}
-
-@cli.command()
-@click.option(
-    "-d",
-    "--description",
-    type=str,
-    help="Description for the environment."
-)
-@click.option(
-    "-a",
-    "--alias",
-    type=str,
-    help="Specify a custom alias (otherwise it will be the name of the venv)."
-)
-@click.option(
-    "-p",
-    "--python",
-    type=str,
-    help=(
-        "Python binary to create the virtual env from. Either a full path or the name of a binary "
-         "in your PATH. If not provided, the created venv will link to the binary that quickenv "
-         "is installed with."
-    )
-)
-@click.argument('name')
-@click.pass_context
-def create(ctx, name, description=None, alias=None, python=None):
-    """
-    Creates a new virtual environment.
-    """
-    if ' ' in name:
-        click.echo("Error: Virtual environment names cannot contain spaces.")
-        sys.exit(1)
-
-    alias = alias if alias is not None else name
-    if not alias.isalnum():
-        click.echo("Error: Aliases cannot contain spaces.")
-        sys.exit(1)
-
-    path = ctx.obj['path']
-    venv_path = os.path.join(path, name)
-    if os.path.exists(venv_path):
-        click.echo('A virtual environment with this name already exists.')
-        sys.exit(126)
 
+_HOME = os.path.expanduser('~')
+_DEFAULT_PATH = os.environ.get('QUICKENV_DIRECTORY', os.path.join(_HOME, '.quickenvs'))
+
+def __getattr__(name):
+    # The click CLI is loaded on first access so that the fast paths in
+    # __main__ can use the helpers here without importing click.
+    if name == 'cli':
+        from quickenv.commands import cli
+        return cli
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@contextlib.contextmanager
+def _locked(path, wait=True):
+    """
+    Holds an exclusive lock on the venv directory for the duration of the block.
+
+    create and delete hold it while they check and modify the alias files,
+    so parallel runs can't both claim an alias or lose each other's changes
+    when a file is rewritten.
+
+    If wait is False, this doesn't block or raise when the lock can't be
+    taken, e.g. because another run holds it or the directory is read-only,
+    and yields whether the lock was acquired.
+    """
+    import fcntl
+
+    fd = None
+    try:
+        fd = os.open(os.path.join(path, '.lock'), os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        acquired = True
+    except OSError:
+        if wait:
+            if fd is not None:
+                os.close(fd)
+            raise
+        acquired = False
+    try:
+        yield acquired
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+def _load_alias_set(path):
+    """
+    Returns the set of aliases in use, read from the 'aliases.names' file.
+
+    If the names file doesn't exist yet, it is built from the 'aliases' file.
+    """
+    names_file = os.path.join(path, 'aliases.names')
+    try:
+        with open(names_file, 'r') as f:
+            return {line.rstrip('\n') for line in f}
+    except FileNotFoundError:
+        pass
+
+    alias_set = set()
     alias_file = os.path.join(path, 'aliases')
     if os.path.exists(alias_file):
         with open(alias_file, 'r') as f:
-            for line in f.readlines():
-                if line.startswith('alias {}='.format(alias)):
-                    click.echo(f"Alias '{alias}' is already in use.")
-                    sys.exit(126)
-
-    click.echo("Creating...")
-    if python is not None:
-        bin = find_executable(python)
-        if bin is None:
-            click.echo(f"No python binary '{python}' could be found")
-            sys.exit(126)
-        subprocess.check_call([bin, '-m', 'venv', venv_path])
-    else:
-        venv.create(venv_path, with_pip=True)
-    click.echo("Upgrading pip and setuptools...")
-    subprocess.check_call([os.path.join(venv_path, 'bin', 'pip'), 'install', '-U', 'pip', 'setuptools'])
-
-    description = "No description provided" if description is None else description
-    with open(os.path.join(venv_path, '.quickenv_description'), 'w') as f:
-        f.write(description + '\n')
-
-    with open(alias_file, 'a') as f:
-        f.write(f'alias {alias}=". {venv_path}/bin/activate"\n')
-
-    with open(os.path.join(venv_path, '.quickenv_alias'), 'w') as f:
-        f.write(alias + '\n')
-
-    with open(os.path.join(os.path.expanduser('~'), '.bash_aliases'), 'a+') as f:
-        f.seek(0)
-        lines = [l.strip('\n') for l in f.readlines()]
-        print(lines)
-        if "source ~/.quickenvs/aliases" not in lines:
-            f.write("source ~/.quickenvs/aliases\n")
-
-    click.echo(
-        f"Done. Source '{alias_file}' or start a new shell and run '{alias}' to activate the venv."
-    )
-    sys.exit(0)
-
-
-@cli.command()
-@click.argument('name')
-@click.pass_context
-def delete(ctx, name):
-    """
-    Deletes a virtual environment.
-    """
-    path = ctx.obj['path']
-    venv_path = os.path.join(path, name)
-    if not os.path.exists(venv_path):
-        click.echo('A virtual environment with this name does not exist.')
-        sys.exit(126)
-
-    with open(os.path.join(venv_path, '.quickenv_alias'), 'r') as f:
-        alias = f.read().strip()
-    
-    alias_file = os.path.join(path, 'aliases')
-    with open(alias_file, 'r') as f:
-        lines = [l for l in f.readlines()
-                 if not l.startswith(f'alias {alias}=". {venv_path}/bin/activate"')]
-    with open(alias_file, 'w') as f:
-        f.writelines(lines)
-
-    shutil.rmtree(venv_path)
-    click.echo(f'Deleted "{name}"')
-
-
-@cli.command()
-@click.pass_context
-def list(ctx):
-    """
-    Lists all virtual environments.
-    """
-    path = ctx.obj['path']
-    ls = os.listdir(path)
-    if not ls:
-        click.echo('No virtual environments found.')
-        sys.exit(126)
-    for name in sorted(ls):
-        venv_path = os.path.join(path, name)
-        if os.path.isdir(venv_path):
-            with open(os.path.join(venv_path, '.quickenv_description'), 'r') as f:
-                description = f.read().strip()
-            with open(os.path.join(venv_path, '.quickenv_alias'), 'r') as f:
-                alias = f.read().strip()
-            click.echo(f"{name} (alias: {alias})")
-            click.echo(f"  {description}")
-
-if __name__ == '__main__':
-    cli()
+            for line in f:
+                if line.startswith('alias '):
+                    alias_set.add(line[len('alias '):].split('=', 1)[0])
+    _write_atomic(names_file, ''.join(f'{a}\n' for a in sorted(alias_set)))
+    return alias_set
+
+def _copy_mode(file_path, tmp_path):
+    """
+    Gives tmp_path the mode of file_path, or 0644 if file_path doesn't exist.
+
+    Temporary files are created 0600, so this must be done before swapping
+    one in place of file_path.
+    """
+    try:
+        mode = os.stat(file_path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o644
+    os.chmod(tmp_path, mode)
+
+def _write_atomic(file_path, text):
+    """
+    Writes text to a temporary file and swaps it in place of file_path.
+    """
+    import tempfile
+
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(file_path), delete=False) as f:
+        f.write(text)
+    _copy_mode(file_path, f.name)
+    os.replace(f.name, file_path)
+
+def _append(file_path, text):
+    """
+    Appends text to a file with a single unbuffered write.
+
+    With O_APPEND, a single write of a short line is atomic, so concurrent
+    appends from parallel quickenv runs can't interleave.
+    """
+    fd = os.open(file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_CLOEXEC, 0o644)
+    try:
+        os.write(fd, text.encode())
+    finally:
+        os.close(fd)
+
+def _remove_lines(file_path, prefix):
+    """
+    Atomically rewrites a file without the lines starting with prefix.
+    """
+    import tempfile
+
+    with open(file_path, 'r') as src, \
+            tempfile.NamedTemporaryFile('w', dir=os.path.dirname(file_path), delete=False) as dst:
+        for line in src:
+            if not line.startswith(prefix):
+                dst.write(line)
+    _copy_mode(file_path, dst.name)
+    os.replace(dst.name, file_path)
+
+def _spawn(argv):
+    """
+    Runs a command and waits for it, raising RuntimeError if it fails.
+
+    Uses posix_spawn rather than subprocess, as we don't need any of the
+    pipe handling that subprocess sets up.
+    """
+    pid = os.posix_spawn(argv[0], argv, os.environ)
+    _, status = os.waitpid(pid, 0)
+    if status != 0:
+        raise RuntimeError(f"Command {argv} failed with wait status {status}")
+
+def _slurp(file_path):
+    """
+    Reads a small text file without the overhead of a buffered file object.
+    """
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        chunks = []
+        while True:
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+    return b''.join(chunks).decode()
+
+def _read_meta(venv_path):
+    """
+    Returns the (alias, description) of a venv.
+
+    Venvs created by older versions of quickenv store these in separate
+    '.quickenv_alias' and '.quickenv_description' files.
+    """
+    try:
+        alias, description = _slurp(f'{venv_path}/.quickenv_meta').split('\n', 1)
+        return alias.strip(), description.strip()
+    except FileNotFoundError:
+        pass
+    alias = _slurp(f'{venv_path}/.quickenv_alias').strip()
+    description = _slurp(f'{venv_path}/.quickenv_description').strip()
+    return alias, description
+
+def _scan_venvs(path):
+    """
+    Returns the DirEntry of each venv in path, sorted by name.
+    """
+    with os.scandir(path) as it:
+        return sorted((e for e in it if e.is_dir()), key=lambda e: e.name)
+
+def _listing_stamp(entries):
+    """
+    Returns the stamp that ties a cached listing to the venv directories it
+    was built from.
+
+    It changes whenever a venv directory is added or removed, including by
+    hand outside of quickenv.
+    """
+    return '/'.join(e.name for e in entries)
+
+def _rebuild_listing(path, write=True):
+    """
+    Regenerates the cached '.listing' file that 'list' prints and returns
+    its contents.
+
+    The first line of the file is the stamp of the venvs it lists. The
+    cache is only written if write is True and the caller holds the lock
+    from _locked, so it can't overwrite a listing built from newer state.
+    The listing is still returned if the cache can't be written, e.g.
+    because the venv directory is read-only.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def read_meta(venv_path):
+        # Directories without metadata are venvs that are still being
+        # created or were left behind by a failed create, so skip them.
+        try:
+            return _read_meta(venv_path)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    entries = _scan_venvs(path)
+    listing = ''
+    if entries:
+        # Metadata reads are independent and block on I/O, which matters on
+        # networked filesystems, so they're done in parallel.
+        with ThreadPoolExecutor(max_workers=min(16, len(entries))) as ex:
+            metas = ex.map(read_meta, [e.path for e in entries])
+            listing = ''.join(
+                f"{entry.name} (alias: {meta[0]})\n  {meta[1]}\n"
+                for entry, meta in zip(entries, metas) if meta is not None
+            )
+    if write:
+        try:
+            _write_atomic(os.path.join(path, '.listing'), f"{_listing_stamp(entries)}\n{listing}")
+        except OSError:
+            pass
+    return listing
+
+def _refresh_listing(path):
+    """
+    Rebuilds the cached listing after a venv has been added or removed.
+
+    Must be called with the lock from _locked held. The change has already
+    been made at this point, so a failed rebuild only discards the cache,
+    which 'list' then rebuilds on its next run.
+    """
+    try:
+        _rebuild_listing(path)
+    except OSError:
+        try:
+            os.remove(os.path.join(path, '.listing'))
+        except FileNotFoundError:
+            pass
+
+def _read_listing(path):
+    """
+    Returns the cached venv listing, rebuilding it if it's missing or its
+    stamp doesn't match the venv directories.
+
+    The rebuilt listing is only cached if the lock can be taken without
+    waiting. While a create holds it, the listing is built but not written.
+    """
+    stamp = _listing_stamp(_scan_venvs(path))
+    try:
+        cached_stamp, listing = _slurp(os.path.join(path, '.listing')).split('\n', 1)
+        if cached_stamp == stamp:
+            return listing
+    except (FileNotFoundError, ValueError):
+        pass
+    with _locked(path, wait=False) as locked:
+        return _rebuild_listing(path, write=locked)
+
+def _needs_pager(listing):
+    """
+    Returns True if the listing is too tall to print without a pager.
+    """
+    import shutil
+
+    return listing.count('\n') > shutil.get_terminal_size().lines
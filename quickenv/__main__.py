@@ -0,0 +1,29 @@
+import sys
+
+from quickenv import _DEFAULT_PATH, _needs_pager, _read_listing
+
+def _fast_list():
+    """
+    Prints the venv listing for a bare 'quickenv list' without loading click.
+
+    Returns False if the listing needs the full CLI, i.e. the venv directory
+    doesn't exist yet, there are no venvs to list or the output should be
+    paged.
+    """
+    try:
+        listing = _read_listing(_DEFAULT_PATH)
+    except FileNotFoundError:
+        return False
+    if not listing or _needs_pager(listing):
+        return False
+    sys.stdout.write(listing)
+    return True
+
+def main():
+    if sys.argv[1:] == ['list'] and _fast_list():
+        return
+    from quickenv.commands import cli
+    cli()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+import os
+import re
+import sys
+
+import click
+
+from quickenv import (
+    _DEFAULT_PATH, _HOME, _append, _load_alias_set, _locked, _needs_pager, _read_listing,
+    _read_meta, _refresh_listing, _remove_lines, _spawn, _write_atomic,
+)
+
+# No leading '-', which bash would read as an option to 'alias'.
+_NAME_RE = re.compile(r'[A-Za-z0-9_][A-Za-z0-9_-]*')
+
+@click.group()
+@click.option(
+    '-p',
+    '--path',
+    type=click.Path(exists=False, dir_okay=True, file_okay=False),
+    default=_DEFAULT_PATH
+)
+@click.pass_context
+def cli(ctx, path):
+    """
+    Manages Python virtual environments.
+
+    You can provide the path that venvs will be stored in
+    or set it as the 'QUICKENV_DIRECTORY' environment variable.
+
+    By default, venvs will be stored in '~/.quickenvs'.
+    """
+    os.makedirs(path, exist_ok=True)
+    ctx.obj = {'path': path}
+
+@cli.command()
+@click.option(
+    "-d",
+    "--description",
+    type=str,
+    help="Description for the environment."
+)
+@click.option(
+    "-a",
+    "--alias",
+    type=str,
+    help="Specify a custom alias (otherwise it will be the name of the venv)."
+)
+@click.option(
+    "-p",
+    "--python",
+    type=str,
+    help=(
+        "Python binary to create the virtual env from. Either a full path or the name of a binary "
+         "in your PATH. If not provided, the created venv will link to the binary that quickenv "
+         "is installed with."
+    )
+)
+@click.argument('name')
+@click.pass_context
+def create(ctx, name, description=None, alias=None, python=None):
+    """
+    Creates a new virtual environment.
+    """
+    import venv
+
+    if not _NAME_RE.fullmatch(name):
+        click.echo(
+            "Error: Virtual environment names can only contain letters, numbers, '_' and '-', "
+            "and cannot start with '-'."
+        )
+        sys.exit(1)
+
+    alias = alias if alias is not None else name
+    if not _NAME_RE.fullmatch(alias):
+        click.echo(
+            "Error: Aliases can only contain letters, numbers, '_' and '-', "
+            "and cannot start with '-'."
+        )
+        sys.exit(1)
+
+    path = ctx.obj['path']
+    venv_path = os.path.join(path, name)
+    with _locked(path):
+        if os.path.exists(venv_path):
+            click.echo('A virtual environment with this name already exists.')
+            sys.exit(126)
+
+        alias_file = os.path.join(path, 'aliases')
+        if alias in _load_alias_set(path):
+            click.echo(f"Alias '{alias}' is already in use.")
+            sys.exit(126)
+
+        click.echo("Creating...")
+        if python is not None:
+            import shutil
+            bin = shutil.which(python)
+            if bin is None:
+                click.echo(f"No python binary '{python}' could be found")
+                sys.exit(126)
+            # The target's venv version is unknown, so don't rely on --upgrade-deps.
+            upgrade_deps = False
+            _spawn([bin, '-m', 'venv', venv_path])
+        else:
+            # Only Python 3.9 to 3.11 upgrade both pip and setuptools here:
+            # older versions lack upgrade_deps and 3.12+ doesn't install setuptools.
+            upgrade_deps = 'setuptools' in getattr(venv, 'CORE_VENV_DEPS', ())
+            if upgrade_deps:
+                venv.create(venv_path, with_pip=True, upgrade_deps=True)
+            else:
+                venv.create(venv_path, with_pip=True)
+
+        # Otherwise venv couldn't upgrade (or install) setuptools itself.
+        if not upgrade_deps:
+            click.echo("Upgrading pip and setuptools...")
+            _spawn([os.path.join(venv_path, 'bin', 'pip'), 'install', '-U', 'pip', 'setuptools'])
+
+        description = "No description provided" if description is None else description
+        # Written atomically so a concurrent listing rebuild never sees it half-written.
+        _write_atomic(f'{venv_path}/.quickenv_meta', f"{alias}\n{description}\n")
+
+        _append(alias_file, f'alias {alias}=". {venv_path}/bin/activate"\n')
+        _append(os.path.join(path, 'aliases.names'), alias + '\n')
+
+        # The sentinel records that '.bash_aliases' has been checked, so it's
+        # only scanned the first time a venv is created in this directory.
+        sentinel = os.path.join(path, '.sourced')
+        if not os.path.exists(sentinel):
+            bash_aliases = os.path.join(_HOME, '.bash_aliases')
+            sourced = False
+            if os.path.exists(bash_aliases):
+                with open(bash_aliases, 'r') as f:
+                    for line in f:
+                        if line.rstrip('\n') == "source ~/.quickenvs/aliases":
+                            sourced = True
+                            break
+            if not sourced:
+                _append(bash_aliases, "source ~/.quickenvs/aliases\n")
+            try:
+                open(sentinel, 'x').close()
+            except FileExistsError:
+                pass
+
+        _refresh_listing(path)
+
+    click.echo(
+        f"Done. Source '{alias_file}' or start a new shell and run '{alias}' to activate the venv."
+    )
+    sys.exit(0)
+
+
+@cli.command()
+@click.argument('name')
+@click.pass_context
+def delete(ctx, name):
+    """
+    Deletes a virtual environment.
+    """
+    import shutil
+
+    path = ctx.obj['path']
+    venv_path = os.path.join(path, name)
+    with _locked(path):
+        if not os.path.exists(venv_path):
+            # The cached listing may still show a venv that was removed by hand.
+            _refresh_listing(path)
+            click.echo('A virtual environment with this name does not exist.')
+            sys.exit(126)
+
+        alias, _ = _read_meta(venv_path)
+
+        alias_file = os.path.join(path, 'aliases')
+        _remove_lines(alias_file, f'alias {alias}=". {venv_path}/bin/activate"')
+        names_file = os.path.join(path, 'aliases.names')
+        if os.path.exists(names_file):
+            _remove_lines(names_file, alias + '\n')
+
+        shutil.rmtree(venv_path)
+        _refresh_listing(path)
+    click.echo(f'Deleted "{name}"')
+
+
+@cli.command()
+@click.pass_context
+def list(ctx):
+    """
+    Lists all virtual environments.
+    """
+    listing = _read_listing(ctx.obj['path'])
+    if not listing:
+        click.echo('No virtual environments found.')
+        sys.exit(126)
+
+    if _needs_pager(listing):
+        click.echo_via_pager(listing)
+    else:
+        click.echo(listing, nl=False)
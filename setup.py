@@ -5,7 +5,7 @@ setup(
     packages=['quickenv'],
     entry_points={
         'console_scripts': [
-            'quickenv = quickenv:cli'
+            'quickenv = quickenv.__main__:main'
         ]
     },
     install_requires=[